@@ -1,9 +1,35 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
+from flask.json.provider import JSONProvider
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import math
+import os
+import re
+import socket
+import string
+import ijson
+import numpy as np
+import orjson
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from cachetools import TTLCache
 from flask_cors import CORS
 
+class OrjsonProvider(JSONProvider):
+    """
+    Use orjson for jsonify() and request.json (faster than the stdlib json).
+    """
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
 print(">>> app.py is running")
@@ -12,40 +38,175 @@ NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
 
+# (connect, read) timeout in seconds for every upstream call
+HTTP_TIMEOUT = (3, 10)
+OVERPASS_TIMEOUT = (3, 30)  # Overpass queries can take a while server-side
+HTTP_RETRIES = 3  # retries on connection errors and 429/502/503/504
+
+
+def running_under_gevent():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+# Chats one gunicorn gevent worker holds at once; the procfile passes the same
+# WORKER_CONNECTIONS to --worker-connections.
+WORKER_CONNECTIONS = int(os.environ.get("WORKER_CONNECTIONS", 200))
+
+# Threads for the weather/places agents. Under gevent they are greenlets, so
+# every chat gets one per agent; otherwise (python app.py) they are real OS
+# threads and stay few.
+AGENT_WORKERS = 2 * WORKER_CONNECTIONS if running_under_gevent() else 8
+
+# One shared session so connections (and TLS handshakes) to the APIs are reused
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "tourism-multi-agent/1.0"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,  # one pool per API host (3) plus a spare
+    # Enough kept-alive connections per host for every concurrent caller:
+    # agents run in the executor, geocoding runs in the request itself
+    pool_maxsize=max(AGENT_WORKERS, WORKER_CONNECTIONS),
+    max_retries=Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=["GET", "POST"],  # Overpass queries are read-only
+    ),
+))
+
+# Cache DNS answers for the API hosts, so opening a new pooled connection
+# doesn't need a lookup every time. Other hosts resolve as usual.
+API_HOSTS = {urlsplit(url).hostname for url in [NOMINATIM_URL, OPEN_METEO_URL, OVERPASS_URL]}
+_dns_cache = TTLCache(maxsize=64, ttl=300)  # 5 minutes
+_dns_lock = threading.Lock()
+_system_getaddrinfo = socket.getaddrinfo
+
+
+def cached_getaddrinfo(host, *args, **kwargs):
+    if host not in API_HOSTS:
+        return _system_getaddrinfo(host, *args, **kwargs)
+
+    key = (host, args, tuple(sorted(kwargs.items())))
+    with _dns_lock:
+        cached = _dns_cache.get(key)
+    if cached is not None:
+        return list(cached)
+
+    result = _system_getaddrinfo(host, *args, **kwargs)
+    with _dns_lock:
+        _dns_cache[key] = result
+    return list(result)
+
+
+socket.getaddrinfo = cached_getaddrinfo
+
+# In-memory cache for geocoding results (place name -> coordinates).
+# Flask can serve requests from several threads, so access goes through a lock.
+_geocode_cache = TTLCache(maxsize=4096, ttl=86400)  # 1 day
+_geocode_lock = threading.Lock()
+
+# Weather and places are cached on rounded coordinates so nearby lookups
+# (~1.1 km for weather, ~111 m for places) share the same entry.
+_weather_cache = TTLCache(maxsize=1024, ttl=600)  # 10 minutes
+_weather_lock = threading.Lock()
+
+_places_cache = TTLCache(maxsize=1024, ttl=3600)  # 1 hour
+_places_lock = threading.Lock()
+
+# Overpass queries currently running, by places cache key. Concurrent requests
+# for the same key wait on the running query instead of sending their own.
+_places_inflight = {}
+# How long a request waits for someone else's query: every attempt of the owner
+# timing out (connect + read), plus slack for retry backoff. If that passes
+# anyway (e.g. a slowly trickling response), the waiter queries by itself.
+PLACES_WAIT_TIMEOUT = (HTTP_RETRIES + 1) * sum(OVERPASS_TIMEOUT) + 10
+
+# Worker pool for running the (independent) weather and places agents in parallel
+_executor = ThreadPoolExecutor(max_workers=AGENT_WORKERS)
+
 
 # ------------------------------------------------------------
-# Distance function (backend computes distance)
+# Distance functions (backend computes distance)
 # ------------------------------------------------------------
-def distance_km(lat1, lon1, lat2, lon2):
+def distance_km_approx(cos_lat0, lat0, lon0, lat, lon):
+    """
+    Equirectangular approximation of haversine_vec, good to ~0.5% within a few
+    tens of km. cos_lat0 is cos(radians(lat0)), computed once by the caller.
+    lat/lon can be single values or NumPy arrays.
+    """
     R = 6371  # Earth radius in km
-    d_lat = math.radians(lat2 - lat1)
-    d_lon = math.radians(lon2 - lon1)
+    d_lon = (lon - lon0 + 180) % 360 - 180  # shortest way round, across ±180° too
+    return R * np.hypot(np.radians(d_lon) * cos_lat0, np.radians(lat - lat0))
+
+
+def haversine_vec(lat0, lon0, lats, lons):
+    """
+    Great-circle (haversine) distance in km from one point to many points at
+    once (NumPy arrays).
+    """
+    R = 6371  # Earth radius in km
+    lats = np.radians(np.asarray(lats, dtype=float))
+    lons = np.radians(np.asarray(lons, dtype=float))
+    lat0 = math.radians(lat0)
+    lon0 = math.radians(lon0)
+
+    a = np.sin((lats - lat0) / 2) ** 2 + math.cos(lat0) * \
+        np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+
+def add_distances(places, lat, lon):
+    """
+    Set "distance_km" on every place, measured from (lat, lon).
+    """
+    if not places:
+        return
 
-    a = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(lat1)) * \
-        math.cos(math.radians(lat2)) * math.sin(d_lon / 2) ** 2
+    lats = np.fromiter((p["lat"] for p in places), float, len(places))
+    lons = np.fromiter((p["lon"] for p in places), float, len(places))
+    dists = haversine_vec(lat, lon, lats, lons)
 
-    return R * (2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)))
+    for p, d in zip(places, dists):
+        p["distance_km"] = round(float(d), 2)
 
 
 # ------------------------------------------------------------
 # Intent Detector
 # ------------------------------------------------------------
-def detect_intent(message):
-    text = message.lower()
+_WEATHER_KW = ("weather", "temperature", "temp")
+_PLACES_KW = ("places", "visit", "tourist", "attraction", "plan my trip")
+_NEAR_ME_KW = ("near me", "around me")
+_TRIP_KW = ("trip",)
+
+# All intent keywords in one pattern with a named group per intent, so the
+# message is scanned only once. The pattern is a lookahead, so matches don't
+# consume text and overlapping keywords are all found ("templaces" has both
+# "temp" and "places"), same as `kw in text`. Only one group can match at a
+# given position, which is fine as long as no keyword is a prefix of a
+# keyword of another intent.
+_INTENT_RE = re.compile("(?=" + "|".join(
+    f"(?P<{intent}>{'|'.join(map(re.escape, keywords))})"
+    for intent, keywords in [
+        ("weather", _WEATHER_KW),
+        ("places", _PLACES_KW),
+        ("near_me", _NEAR_ME_KW),
+        ("trip", _TRIP_KW),
+    ]
+) + ")")
 
-    wants_weather = any(
-        w in text for w in ["weather", "temperature", "temp"]
-    )
 
-    wants_places = any(
-        p in text for p in ["places", "visit", "tourist", "attraction", "plan my trip"]
-    )
+def detect_intent(message):
+    found = {m.lastgroup for m in _INTENT_RE.finditer(message.lower())}
 
-    near_me = any(
-        m in text for m in ["near me", "around me"]
-    )
+    wants_weather = "weather" in found
+    wants_places = "places" in found
+    near_me = "near_me" in found
 
-    if "trip" in text and not wants_weather and not wants_places:
+    if "trip" in found and not wants_weather and not wants_places:
         return {"weather": True, "places": True, "near_me": near_me}
 
     return {"weather": wants_weather, "places": wants_places, "near_me": near_me}
@@ -54,24 +215,27 @@ def detect_intent(message):
 # ------------------------------------------------------------
 # Extract City Name
 # ------------------------------------------------------------
-import re  # add this at top of file if not already there
+_RE_FILLER = re.compile(r"(going to|want to|gonna|planning to)\s+")
+_RE_TO_IN = re.compile(r"\b(to|in)\s+([a-zA-Z\s]+)")
+_RE_PUNCT = re.compile(r"[?,.]")
+
 
 def extract_place_name(message):
     text = message.lower()
 
     # Remove some filler phrases but DON'T eat the "to <city>" itself
     cleaned = text
-    cleaned = re.sub(r"(going to|want to|gonna|planning to)\s+", "", cleaned)
+    cleaned = _RE_FILLER.sub("", cleaned)
 
     # Look for "to <place>" or "in <place>"
-    match = re.search(r"\b(to|in)\s+([a-zA-Z\s]+)", cleaned)
+    match = _RE_TO_IN.search(cleaned)
     if not match:
         return None
 
     place = match.group(2).strip()
 
     # Stop at punctuation like comma, question mark, etc.
-    place = re.split(r"[?,.]", place)[0].strip()
+    place = _RE_PUNCT.split(place, maxsplit=1)[0].strip()
 
     if not place:
         return None
@@ -84,32 +248,47 @@ def extract_place_name(message):
 # Geocode Agent (Nominatim)
 # ------------------------------------------------------------
 def geocode_place(place):
+    key = place.strip().lower()
+
+    with _geocode_lock:
+        cached = _geocode_cache.get(key)
+    if cached is not None:
+        return dict(cached)  # copy so callers can't change the cached entry
+
     params = {
         "q": place,
         "format": "json",
         "limit": 1
     }
-    headers = {
-        "User-Agent": "tourism-multi-agent/1.0"
-    }
-
-    res = requests.get(NOMINATIM_URL, params=params, headers=headers)
-    data = res.json()
+    res = SESSION.get(NOMINATIM_URL, params=params, timeout=HTTP_TIMEOUT)
+    data = orjson.loads(res.content)
 
     if not data:
         return None
 
-    return {
+    geo = {
         "lat": float(data[0]["lat"]),
         "lon": float(data[0]["lon"]),
         "name": data[0]["display_name"]
     }
 
+    with _geocode_lock:
+        _geocode_cache[key] = geo
+
+    return dict(geo)
+
 
 # ------------------------------------------------------------
 # Weather Agent (Open-Meteo)
 # ------------------------------------------------------------
 def get_weather(lat, lon):
+    key = (round(lat, 2), round(lon, 2))
+
+    with _weather_lock:
+        cached = _weather_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -117,68 +296,157 @@ def get_weather(lat, lon):
         "hourly": "precipitation_probability"
     }
 
-    res = requests.get(OPEN_METEO_URL, params=params)
-    data = res.json()
+    res = SESSION.get(OPEN_METEO_URL, params=params, timeout=HTTP_TIMEOUT)
+    data = orjson.loads(res.content)
 
     weather = {
         "temp_c": data.get("current_weather", {}).get("temperature"),
         "rain_chance": data.get("hourly", {}).get("precipitation_probability", [None])[0]
     }
 
-    return weather
+    # Don't keep error replies around (cache only real readings)
+    if res.ok and weather["temp_c"] is not None:
+        with _weather_lock:
+            _weather_cache[key] = weather
+
+    return dict(weather)
+
+
+# very touristy = 3, good tourist spot = 2
+_TOURISM_SCORE = {"museum": 3, "theme_park": 3, "zoo": 3, "attraction": 2}
+
 
 def place_score(tags):
     """
     Higher score = more touristy / famous.
     """
-    tourism = tags.get("tourism", "")
-    historic = "historic" in tags
+    # Historic places are good tourist spots too; anything else (parks, temples etc.) = 1
+    return _TOURISM_SCORE.get(tags.get("tourism")) or (2 if "historic" in tags else 1)
 
-    if tourism in ["museum", "theme_park", "zoo"]:
-        return 3  # very touristy
-    if tourism == "attraction" or historic:
-        return 2  # good tourist spot
-    return 1  # parks, temples etc.
 
 # ------------------------------------------------------------
 # Places Agent (Overpass)
 # ------------------------------------------------------------
+# Names containing any of these are offices, hospitals etc., not tourist spots
+_BAD_KW = (
+    "company", "group", "finance", "corporation", "pvt", "limited", "ltd",
+    "hospital", "clinic", "bank", "school", "college", "office"
+)
+_BAD_RE = re.compile("|".join(map(re.escape, _BAD_KW)))
+
+# Radii (meters) queried around a point, smallest first. Overpass returns
+# elements in id order, not by distance, so a capped output for one big radius
+# would be an arbitrary sample of it. Each radius gets its own capped output
+# instead, all sent in a single request.
+OVERPASS_RADII = [5000, 10000, 20000, 30000]
+OVERPASS_HEADER = "[out:json][timeout:25];"
+
+# Tourist POIs within $r meters of ($lat, $lon), output as set .r$r (max 80).
+# Values of the same key share one anchored regex filter instead of a statement each.
+OVERPASS_TEMPLATE = string.Template("""(
+node["tourism"~"^(attraction|museum|theme_park|zoo)$$"](around:$r,$lat,$lon);
+node["historic"](around:$r,$lat,$lon);
+node["leisure"~"^(park|garden)$$"](around:$r,$lat,$lon);
+node["natural"~"^(beach|peak)$$"](around:$r,$lat,$lon);
+node["amenity"="place_of_worship"](around:$r,$lat,$lon);
+)->.r$r;
+.r$r out 80;""")
+
+
 def get_places(lat, lon, limit=5):
     print(">>> get_places called for:", lat, lon)  # debug
 
-    # We will try bigger and bigger radii until we get enough places
-    radii = [5000, 10000, 20000, 30000]  # 5 km, 10 km, 20 km, 30 km
-
-    collected = []
-
-    for r in radii:
-        print(f">>> querying Overpass with radius {r} meters")
-
-        query = f"""
-        [out:json];
-        (
-          node["tourism"="attraction"](around:{r},{lat},{lon});
-          node["tourism"="museum"](around:{r},{lat},{lon});
-          node["tourism"="theme_park"](around:{r},{lat},{lon});
-          node["tourism"="zoo"](around:{r},{lat},{lon});
-          node["historic"](around:{r},{lat},{lon});
-          node["leisure"="park"](around:{r},{lat},{lon});
-          node["leisure"="garden"](around:{r},{lat},{lon});
-          node["natural"="beach"](around:{r},{lat},{lon});
-          node["natural"="peak"](around:{r},{lat},{lon});
-          node["amenity"="place_of_worship"](around:{r},{lat},{lon});
-        );
-        out 80;
-        """
-
-        res = requests.post(OVERPASS_URL, data=query)
-        data = res.json()
-
-        if "elements" not in data:
-            print(">>> no elements for radius", r)
-            continue
-
-        for el in data["elements"]:
+    key = (round(lat, 3), round(lon, 3), limit)
+
+    with _places_lock:
+        cached = _places_cache.get(key)
+        future = _places_inflight.get(key)
+        if cached is None and future is None:
+            # We are the first one asking: run the query ourselves
+            owner = True
+            future = _places_inflight[key] = Future()
+        else:
+            owner = False
+
+    if cached is not None:
+        print(">>> places cache hit")
+        return [dict(p) for p in cached]
+
+    if not owner:
+        print(">>> waiting for in-flight Overpass query")
+        try:
+            return [dict(p) for p in future.result(timeout=PLACES_WAIT_TIMEOUT)]
+        except FutureTimeoutError:
+            print(">>> in-flight Overpass query too slow, querying ourselves")
+            return fetch_places(lat, lon, limit)
+
+    try:
+        final_places = fetch_places(lat, lon, limit)
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    except BaseException:
+        # GreenletExit, gevent.Timeout, KeyboardInterrupt etc. belong to this
+        # request only; waiters get a normal error so they never hang either
+        future.set_exception(RuntimeError("places query aborted"))
+        raise
+    else:
+        with _places_lock:
+            if final_places:
+                _places_cache[key] = final_places
+        future.set_result(final_places)
+    finally:
+        with _places_lock:
+            _places_inflight.pop(key, None)
+
+    return [dict(p) for p in final_places]
+
+
+def rank_places(scores, dists, limit):
+    """
+    Indices of the best 'limit' places: highest score first, then closest.
+    Works on NumPy arrays only, so no Python code runs per place.
+    """
+    candidates = np.arange(len(scores))
+
+    # Prefer close places: use the smallest radius that still gives enough of them
+    for radius_km in [5, 10, 20]:
+        nearby = np.flatnonzero(dists <= radius_km)
+        if len(nearby) >= limit:
+            candidates = nearby
+            break
+
+    order = np.lexsort((dists[candidates], -scores[candidates]))
+    return candidates[order[:limit]]
+
+
+def fetch_places(lat, lon, limit):
+    """
+    Query Overpass around (lat, lon) and return the best 'limit' places.
+    """
+    # One Overpass request with a separate output per radius; the prefer-close
+    # choice between radii is made locally in rank_places
+    print(f">>> querying Overpass with radii {OVERPASS_RADII} meters")
+
+    query = "\n".join(
+        [OVERPASS_HEADER] +
+        [OVERPASS_TEMPLATE.substitute(r=r, lat=lat, lon=lon) for r in OVERPASS_RADII]
+    )
+
+    cos_lat0 = math.cos(math.radians(lat))
+
+    # Candidates are kept as parallel lists (one entry per place) and turned
+    # into arrays for ranking; dicts are only built for the final places
+    names, lats, lons, scores = [], [], [], []
+    seen = set()  # (name, lat, lon) of places already collected
+
+    # Stream the response and handle elements one by one instead of
+    # decoding the whole JSON document first
+    res = SESSION.post(OVERPASS_URL, data=query, timeout=OVERPASS_TIMEOUT, stream=True)
+    with res:
+        res.raw.decode_content = True  # let urllib3 undo gzip
+        elements = ijson.items(res.raw, "elements.item", use_float=True)
+        for el in elements:
             tags = el.get("tags", {})
             name = tags.get("name")
 
@@ -186,50 +454,33 @@ def get_places(lat, lon, limit=5):
                 continue
 
             # Filter out boring / non-tourist POIs
-            bad_keywords = [
-                "company", "group", "finance", "corporation", "pvt", "limited", "ltd",
-                "hospital", "clinic", "bank", "school", "college", "office"
-            ]
-            lower_name = name.lower()
-            if any(bad in lower_name for bad in bad_keywords):
+            if _BAD_RE.search(name.lower()):
                 continue
 
-            # Avoid duplicates (same name, same coordinates)
-            already = any(
-                p["name"] == name and abs(p["lat"] - el["lat"]) < 1e-5 and abs(p["lon"] - el["lon"]) < 1e-5
-                for p in collected
-            )
-            if already:
+            # Avoid duplicates (same name, same coordinates to ~1 m)
+            place_key = (name, round(el["lat"], 5), round(el["lon"], 5))
+            if place_key in seen:
                 continue
+            seen.add(place_key)
 
-            collected.append({
-                "name": name,
-                "lat": el["lat"],
-                "lon": el["lon"],
-                "tags": tags  # keep tags temporarily for scoring
-            })
-
-        # If we have enough places, we can stop expanding radius
-        if len(collected) >= limit:
-            break
+            names.append(name)
+            lats.append(el["lat"])
+            lons.append(el["lon"])
+            scores.append(place_score(tags))
 
-    if not collected:
+    if not names:
         print(">>> no collected places at all")
         return []
 
-    # Compute distance from the reference point (city center or user) and score
-    for p in collected:
-        p["distance_km"] = round(distance_km(lat, lon, p["lat"], p["lon"]), 2)
-        p["score"] = place_score(p["tags"])
+    # Approximate distance from the reference point (city center or user),
+    # only used for ranking; the exact one is computed for the final places
+    dists = distance_km_approx(cos_lat0, lat, lon, np.asarray(lats), np.asarray(lons))
 
-    # Sort: highest score first, then closest distance
-    collected.sort(key=lambda x: (-x["score"], x["distance_km"]))
-
-    # Take at most 'limit' closest highest-scored places
     final_places = [
-        {"name": p["name"], "lat": p["lat"], "lon": p["lon"], "distance_km": p["distance_km"]}
-        for p in collected[:limit]
+        {"name": names[i], "lat": lats[i], "lon": lons[i]}
+        for i in rank_places(np.asarray(scores), dists, limit)
     ]
+    add_distances(final_places, lat, lon)  # exact distances for the user
 
     print(">>> final places used:", [p["name"] for p in final_places])
     return final_places
@@ -244,6 +495,24 @@ def home():
     return render_template("index.html")
 
 
+# ------------------------------------------------------------
+# JSON reply with ETag (repeated identical questions get a 304)
+# ------------------------------------------------------------
+def json_reply(payload):
+    response = jsonify(payload)
+    response.add_etag()  # hash of the JSON body
+
+    # Werkzeug only handles If-None-Match for GET/HEAD, so check it here for POST.
+    # If-None-Match uses weak comparison. "*" is not treated as a match: it
+    # can't name a reply the client already has.
+    etag, _ = response.get_etag()
+    if_none_match = request.if_none_match
+    if not if_none_match.star_tag and if_none_match.contains_weak(etag):
+        return Response(status=304, headers={"ETag": response.headers["ETag"]})
+
+    return response
+
+
 # ------------------------------------------------------------
 # Parent Agent (Core Brain)
 # ------------------------------------------------------------
@@ -264,13 +533,12 @@ def chat():
         places = get_places(user_lat, user_lon)
 
         # Calculate distance
-        for p in places:
-            p["distance_km"] = round(distance_km(user_lat, user_lon, p["lat"], p["lon"]), 2)
+        add_distances(places, user_lat, user_lon)
 
         reply = "Here are the nearest places you can visit:\n" + \
                 "\n".join([p["name"] for p in places])
 
-        return jsonify({
+        return json_reply({
             "reply": reply,
             "weather": None,
             "places": places,
@@ -282,21 +550,25 @@ def chat():
     # City-based query
     place_name = extract_place_name(user_message)
     if not place_name:
-        return jsonify({"reply": "Please mention a city name.", "places": []})
+        return json_reply({"reply": "Please mention a city name.", "places": []})
 
     geo = geocode_place(place_name)
     if not geo:
-        return jsonify({"reply": f'I don’t know if "{place_name}" exists.'})
+        return json_reply({"reply": f'I don’t know if "{place_name}" exists.'})
 
     lat = geo["lat"]
     lon = geo["lon"]
 
     final_reply = ""
 
+    # Start both agents at once so we only wait for the slower one
+    weather_future = _executor.submit(get_weather, lat, lon) if wants_weather else None
+    places_future = _executor.submit(get_places, lat, lon) if wants_places else None
+
     # Weather
     weather_info = None
-    if wants_weather:
-        weather_info = get_weather(lat, lon)
+    if weather_future:
+        weather_info = weather_future.result()
         final_reply += (
             f"In {place_name} it’s currently {weather_info['temp_c']}°C "
             f"with a {weather_info['rain_chance']}% chance to rain.\n"
@@ -304,12 +576,11 @@ def chat():
 
     # Places
     places = []
-    if wants_places:
-        places = get_places(lat, lon)
+    if places_future:
+        places = places_future.result()
 
         # Distance from city center
-        for p in places:
-            p["distance_km"] = round(distance_km(lat, lon, p["lat"], p["lon"]), 2)
+        add_distances(places, lat, lon)
 
         names = "\n".join([p["name"] for p in places])
 
@@ -318,7 +589,7 @@ def chat():
         else:
             final_reply += f"And these are the places you can go:\n{names}"
 
-    return jsonify({
+    return json_reply({
         "reply": final_reply.strip(),
         "weather": weather_info,
         "places": places,